@@ -1,231 +1,245 @@
 import json 
 import sqlite3
 import os 
+import heapq
+import math
+import functools
+import pathlib
 
+try:
+    import orjson
+except ImportError:  # orjson is optional, we fall back to the standard json module
+    orjson = None
 
 
-def get_all_paths_with_sequential_time(database_path, origin, destination):
+
+def get_routes(database_path):
     """
-    Reads through the SQLite database ROUTE and outputs all the possible paths from Tatooine to Endor
+    Reads through the SQLite database ROUTE and outputs the routes that can be taken from each planet
     :database_path: where the database is stored 
-    :origin: the planet the ship starts from (Tatooine)
-    :destination: the planet the ship aims (Endor)
 
-    :return: all paths (stops between Tatooine and Endor) along with their travel times
+    :return: the id of each planet (planet names are interned to small integers, cheaper to hash and compare) and
+             the adjacency list giving, for each planet id, the neighbor planet ids along with their travel times
     """
-    # Establish a connection to the SQLite database
-    conn = sqlite3.connect(database_path)
+    # Establish a read-only connection to the SQLite database: we never write to it, and a missing file is reported instead of created
+    conn = sqlite3.connect(pathlib.Path(database_path).resolve().as_uri() + "?mode=ro", uri=True)
     cursor = conn.cursor()
 
-    def find_paths(current_node, current_time=0, path=[]):
-        # Add the current node and its time to the path
-        path = path + [(current_node, current_time)]
-        if current_node == destination:
-            # If the current node is the destination, yield the path excluding the first element (start node and initial time 0)
-            yield path[1:]
-        else:
-            # Execute a SELECT query to find all neighbors of the current node and their travel times (both forward and backward)
-            cursor.execute("SELECT destination, travel_time FROM ROUTES WHERE origin=?", (current_node,))
-            forward_rows = cursor.fetchall()
-            cursor.execute("SELECT origin, travel_time FROM ROUTES WHERE destination=?", (current_node,))
-            backward_rows = cursor.fetchall()
-
-            for row in forward_rows:
-                next_node, travel_time = row
-                if next_node not in [node for node, _ in path]:  # Avoid cycles by checking if the next node is already in the path
-                    # Recursively call find_paths for each forward neighbor node with updated current time
-                    yield from find_paths(next_node, travel_time, path)
-
-            for row in backward_rows:
-                prev_node, travel_time = row
-                if prev_node not in [node for node, _ in path]:  # Avoid cycles by checking if the previous node is already in the path
-                    # Recursively call find_paths for each backward neighbor node with updated current time
-                    yield from find_paths(prev_node, travel_time, path)
-
-    # Find all paths from the origin to the destination
-    all_paths = list(find_paths(origin))
+    # The graph is small and does not change during a run, so we load all the routes with a single query
+    cursor.execute("SELECT origin, destination, travel_time FROM ROUTES")
+    routes = cursor.fetchall()
 
     # Close the database connection
     conn.close()
 
-    return all_paths
+    # Give each planet a contiguous integer id, in the order the planets appear in the routes
+    planet_ids = {}
+    for route_origin, route_destination, _ in routes:
+        planet_ids.setdefault(route_origin, len(planet_ids))
+        planet_ids.setdefault(route_destination, len(planet_ids))
+
+    # Build the adjacency list of each planet: routes can be travelled in both directions (forward and backward)
+    # A route listed twice (or once in each direction) is only added once, so the search does not expand the same jump twice
+    adjacency = [[] for _ in planet_ids]
+    seen = set()
+    for route_origin, route_destination, travel_time in routes:
+        origin_id, destination_id = planet_ids[route_origin], planet_ids[route_destination]
+        route = (min(origin_id, destination_id), max(origin_id, destination_id), travel_time)
+        if route in seen:
+            continue
+        seen.add(route)
+        adjacency[origin_id].append((destination_id, travel_time))
+        if destination_id != origin_id:
+            adjacency[destination_id].append((origin_id, travel_time))
+
+    return planet_ids, adjacency
 
 
 
+# Probability of getting captured for each number of times we already encountered a bounty hunter, precomputed once
+CAPTURE_PROBABILITIES = [0.9**count_bounty / 10 for count_bounty in range(64)]
+
 def compute_probability(count_bounty):
     """
     Computes the probability of getting captured on a given day
     :count_bounty: the number of times we encountered a bounty hunter 
     """
-    return 9**(count_bounty)/10**(count_bounty+1)
+    if count_bounty < len(CAPTURE_PROBABILITIES):
+        return CAPTURE_PROBABILITIES[count_bounty]
+    return 0.9**count_bounty / 10
 
-def check_bounty(bounty_hunters, current_day, current_planet):
-    """
-    Checks is there is a bounty hunter on a given day and planet
-    :bounty_hunters: stores the information about bounty hunters (day and planet)
-    :current_day: the day we check if there is a bounty hunter 
-    :current_planet: the planet we check if there is a bounty hunter 
 
-    :return: if there is a bounty hunter or not (boolean)
+def compute_min_times_to(adjacency, destination_station):
     """
-    return any(hunter['day'] == current_day and hunter['planet'] == current_planet for hunter in bounty_hunters)
-
+    Computes the minimal travel time from each planet to Endor (ignoring refuels and bounty hunters) with Dijkstra
+    :adjacency: the routes that can be taken from each planet id along with their travel times
+    :destination_station: id of the planet the ship aims (Endor)
 
-def num_of_days_to_wait(base_autonomy, path_times, countdown):
+    :return: list giving, for each planet id, the minimal number of days to reach Endor (infinity if it cannot be reached)
     """
-    Computes the number of days we can afford to wait on the whole trip
-    :base_autonomy: base autonomy of the falcon 
-    :path_times: stores the travel times between each planet of the given path 
-    :countdown: the number of days before the death star kills 
-
-    :return: the number of days we can afford to wait given the countdown and the path 
-    """
-    autonomy = base_autonomy
-    total_time = 0
-    for j in range(len(path_times)):
-        if autonomy >= path_times[j]:
-            autonomy -= path_times[j]
-            total_time += path_times[j]
-        else:
-            total_time += 1 
-            autonomy = base_autonomy - path_times[j]
-            total_time += path_times[j]
-    return max(countdown - total_time, 0)
-
+    min_times = [math.inf] * len(adjacency)
+    min_times[destination_station] = 0
+    queue = [(0, destination_station)]
 
+    while queue:
+        time, planet = heapq.heappop(queue)
+        if time > min_times[planet]:
+            continue
+        # Routes can be travelled in both directions, so the time from a neighbor to Endor goes through this planet
+        for next_planet, travel_time in adjacency[planet]:
+            if time + travel_time < min_times[next_planet]:
+                min_times[next_planet] = time + travel_time
+                heapq.heappush(queue, (time + travel_time, next_planet))
 
+    return min_times
 
 
-def compute_probas_per_path(all_paths_stops, all_paths_times, base_autonomy, countdown, bounty_hunters, origin_station):
+def compute_best_probability(adjacency, base_autonomy, countdown, bounty_set, origin_station, destination_station):
     """
-    Computes the probability of success of each path going from Tatooine to Endor  
-    This probability is discounted everytime the ship is on the same planet as a bounty hunter 
-    The ship is allowed to wait if it has enough time 
-    :all_paths_stops: list containing each path (= list that contains each stop until Endor)
-    :all_paths_times: list containing each path (= list that contains each travel time until Endor)
+    Computes the maximal probability of success of the ship going from Tatooine to Endor before the countdown
+    We search the best plan over the states (planet, day, autonomy) of the ship with Dijkstra, the cost of a plan being
+    the number of times the ship is on the same planet as a bounty hunter (the probability of success decreases with it)
+    Each day, the ship can either jump to a neighbor planet if it has enough fuel, or stay on its planet one day (waiting and refueling)
+    :adjacency: the routes that can be taken from each planet id along with their travel times
     :base_autonomy: the base autonomy the Falcon has and can refuel to 
     :countdown: number of days before the Death Star kills 
-    :bounty_hunters: informations about the bounty hunters 
-    :origin_station: where the ship starts from (Tatooine)
-
-    :return: list containing probabilities of success for all paths
-    """
-
-    all_paths_probabilities = []
-
-    # We loop over the possible paths computed above
-    for i in range(len(all_paths_stops)):
-        total_time = 0 # initialize the travel time to 0 
-        probability = 1 # we will discount from the maximal probability, 1 
-        autonomy = base_autonomy # initialize the autonomy of the falcon to its base 
-        count_bounty = 0 # tracks the number of times we encountered a bounty hunter 
-
-        # Compute the number of days we are allowed to wait on a planet to avoid bounty hunters 
-        num_wait = num_of_days_to_wait(base_autonomy, all_paths_times[i], countdown) 
-
-        for j in range(len(all_paths_stops[i])):
-            current_planet = all_paths_stops[i][j-1] if j > 0 else origin_station # the current planet we are in the path 
-            planet_to_travel_to = all_paths_stops[i][j] # check the next stop of the path 
-            time_to_planet = all_paths_times[i][j] # check the time it takes to get there 
-
-            # Check if we have enough fuel to go to the next planet 
-            if autonomy >= time_to_planet:
-                autonomy -= time_to_planet # in that case we lose autonomy 
-                total_time += time_to_planet # and the total time increases by the travel time to the planet 
-
-                # We check if there is a bounty hunter on the next planet. If we can afford to stay on the current planet while there is a bounty hunter on the next planet, we do it
-                while check_bounty(bounty_hunters, total_time, planet_to_travel_to) and num_wait > 0:
-                    total_time += 1 # if we wait, the total time increases by one day 
-                    num_wait -= 1 # and we lose one day to wait 
-
-                # After (possibly) waiting, we check if there is a bounty hunter on the next planet 
-                if check_bounty(bounty_hunters, total_time, planet_to_travel_to):
-                    probability -= compute_probability(count_bounty) # we discount the probability using the formula
-                    count_bounty += 1 # we increase the times we encountered a bounty hunter 
-                
-                
-            # if we don't have enough fuel, we need to refuel 
-            else:
-                total_time += 1 # refueling takes one day 
-                autonomy = base_autonomy # we reset the autonomy to its base 
-                
-                # if a bounty hunter is here, we discount the probability of success 
-                if  check_bounty(bounty_hunters, total_time, current_planet):
-                    probability -= compute_probability(count_bounty)
-                    count_bounty+=1
-                
-                # once refueled, we go to the next planet 
-                total_time += time_to_planet
-                autonomy -= time_to_planet
-
-                # however we can check if there is a bounty hunter on the next planet, and wait if we can afford it (and if there is no bounty hunter on the current planet) 
-                while check_bounty(bounty_hunters, total_time, planet_to_travel_to) and not check_bounty(bounty_hunters, total_time, current_planet) and num_wait > 0:
-                    total_time += 1
-                    num_wait -= 1
-                # if there is a bounty hunter on the next planet, we discount the probability 
-                if check_bounty(bounty_hunters, total_time, all_paths_stops[i][j]) :
-                    probability -= compute_probability(count_bounty)
-                    count_bounty += 1
-
-        # if the falcon takes more time than the countdown, probability of success is 0 
-        if total_time > countdown:
-            probability = 0
-
-        # add the probability of the path 
-        all_paths_probabilities.append(probability)
-
-    return all_paths_probabilities
+    :bounty_set: set of (day, planet id) pairs where a bounty hunter is 
+    :origin_station: id of the planet the ship starts from (Tatooine)
+    :destination_station: id of the planet the ship aims (Endor)
 
+    :return: maximal probability of success (0 if Endor cannot be reached before the countdown)
+    """
+    # The ship needs at least min_times[planet] more days to reach Endor from a planet: states that cannot arrive before the countdown are not explored
+    min_times = compute_min_times_to(adjacency, destination_station)
+    if min_times[origin_station] > countdown:
+        return 0
+
+    # Priority queue of (count_bounty, day, planet, autonomy): the states with the fewest bounty hunter encounters are popped first
+    queue = [(0, 0, origin_station, base_autonomy)]
+    visited = set()
+
+    while queue:
+        count_bounty, day, planet, autonomy = heapq.heappop(queue)
+        if planet == destination_station:
+            # The first time we pop Endor, we have the plan with the fewest bounty hunter encounters
+            return 1 - sum(compute_probability(count) for count in range(count_bounty))
+        if (planet, day, autonomy) in visited:
+            continue
+        visited.add((planet, day, autonomy))
+
+        # Stay one day on the current planet: the ship waits and refuels to its base autonomy
+        if day + 1 + min_times[planet] <= countdown:
+            next_count = count_bounty + ((day + 1, planet) in bounty_set)
+            heapq.heappush(queue, (next_count, day + 1, planet, base_autonomy))
+
+        # Jump to a neighbor planet if we have enough fuel and can still reach Endor before the countdown from there
+        for next_planet, travel_time in adjacency[planet]:
+            if travel_time <= autonomy and day + travel_time + min_times[next_planet] <= countdown:
+                next_count = count_bounty + ((day + travel_time, next_planet) in bounty_set)
+                heapq.heappush(queue, (next_count, day + travel_time, next_planet, autonomy - travel_time))
+
+    # Endor cannot be reached before the countdown
+    return 0
+
+
+def _read_json(json_file):
+    """
+    Reads a json file, using orjson (faster) when it is installed 
+    :json_file: path of the json file 
 
-def calculate_odds(millennium_file, empire_file):
+    :return: the content of the json file 
     """
-    Reads the millennium and empire files and output the maximal probability of success for the ship arriving to Endor 
-    :millennium_file: contains information about the origin station, the destination station and the routes it can take 
-    :empire_file: contains information about the countdown, and the planet and time the bounty hunters are 
+    if orjson is not None:
+        with open(json_file, "rb") as data:
+            return orjson.loads(data.read())
+    with open(json_file) as data:
+        return json.load(data)
 
-    :return: maximal probability of success (the aim of the project)
+
+@functools.lru_cache(maxsize=8)
+def _load_millennium(millennium_file, mtime):
     """
-    with open(millennium_file) as millennium:
-        data_millennium = json.load(millennium)
+    Reads the millennium file, the result is cached as long as the file is not modified 
+    :millennium_file: absolute path of the millennium file 
+    :mtime: modification time of the millennium file, part of the cache key 
 
-    with open(empire_file) as empire:
-        data_empire = json.load(empire)
+    :return: the base autonomy, the origin station, the destination station and the path to the universe database
+    """
+    data_millennium = _read_json(millennium_file)
 
     base_autonomy = data_millennium["autonomy"]
-    countdown = data_empire["countdown"]
-    bounty_hunters = data_empire["bounty_hunters"]
-
     origin_station = data_millennium["departure"]
     destination_station = data_millennium["arrival"]
     universe_file = data_millennium["routes_db"]  # Use data_millennium["routes_db"] as the path to the SQLite database file
 
     # Get the directory path of "millennium-falcon.json"
-    directory_path = os.path.dirname(os.path.abspath(millennium_file))
+    directory_path = os.path.dirname(millennium_file)
     # Construct the path to "universe.db" in the same directory as "millennium-falcon.json"
     universe_file = os.path.join(directory_path, "universe.db")
 
-    # Fetch all paths from the origin to the destination using the backend function
-    paths = get_all_paths_with_sequential_time(universe_file, origin_station, destination_station)
+    return base_autonomy, origin_station, destination_station, universe_file
+
+
+@functools.lru_cache(maxsize=8)
+def _load_empire(empire_file, mtime):
+    """
+    Reads the empire file, the result is cached as long as the file is not modified 
+    :empire_file: absolute path of the empire file 
+    :mtime: modification time of the empire file, part of the cache key 
+
+    :return: the countdown and the set of (day, planet) pairs where a bounty hunter is 
+    """
+    data_empire = _read_json(empire_file)
+
+    countdown = data_empire["countdown"]
+    # Store the bounty hunters as a set of (day, planet) pairs, so that checking if a bounty hunter is on a planet on a given day is a single lookup
+    bounty_set = frozenset((hunter["day"], hunter["planet"]) for hunter in data_empire["bounty_hunters"])
+
+    return countdown, bounty_set
+
+
+@functools.lru_cache(maxsize=8)
+def _load_routes(universe_file, mtime):
+    """
+    Loads the routes of the universe database, the result is cached as long as the database is not modified 
+    :universe_file: absolute path of the universe database 
+    :mtime: modification time of the universe database, part of the cache key 
+
+    :return: the id of each planet and the adjacency list of each planet id (see get_routes)
+    """
+    return get_routes(universe_file)
 
-    all_paths_stops = []  # stores all the paths (planets)
-    all_paths_times = []  # stores all the paths (travel times)
 
-    # Store all the paths by planet and by time
-    for path in paths:
-        stops, travel_times = zip(*path)
-        stops = [stop for stop in stops]
-        all_paths_stops.append(stops)
-        travel_times = [time for time in travel_times]
-        all_paths_times.append(travel_times)
+def calculate_odds(millennium_file, empire_file):
+    """
+    Reads the millennium and empire files and output the maximal probability of success for the ship arriving to Endor 
+    The parsed files and the routes are cached, so repeated calls with unchanged files skip loading them again 
+    :millennium_file: contains information about the origin station, the destination station and the routes it can take 
+    :empire_file: contains information about the countdown, and the planet and time the bounty hunters are 
 
-    # Load data from the configuration file (universe database, origin, and destination)
-    # Compute probabilities using compute_probas_per_path backend function
-    all_paths_probabilities = compute_probas_per_path(
-        all_paths_stops, all_paths_times, base_autonomy, countdown, bounty_hunters, origin_station
+    :return: maximal probability of success (the aim of the project)
+    """
+    millennium_file = os.path.abspath(millennium_file)
+    empire_file = os.path.abspath(empire_file)
+
+    base_autonomy, origin_station, destination_station, universe_file = _load_millennium(
+        millennium_file, os.path.getmtime(millennium_file)
     )
+    countdown, bounty_set = _load_empire(empire_file, os.path.getmtime(empire_file))
+
+    # Load the routes from the universe database
+    planet_ids, adjacency = _load_routes(universe_file, os.path.getmtime(universe_file))
 
-    # Calculate maximum probability from all_paths_probabilities list
-    max_probability = max(all_paths_probabilities)
+    # A station without any route can only be "reached" if the ship is already there
+    if origin_station not in planet_ids or destination_station not in planet_ids:
+        return 100 if origin_station == destination_station else 0
 
+    # Convert the bounty hunters planets to planet ids (a bounty hunter on a planet without routes is never met)
+    bounty_ids = set((day, planet_ids[planet]) for day, planet in bounty_set if planet in planet_ids)
+
+    # Compute the maximal probability of success using compute_best_probability backend function
+    max_probability = compute_best_probability(
+        adjacency, base_autonomy, countdown, bounty_ids, planet_ids[origin_station], planet_ids[destination_station]
+    )
 
     return max_probability*100
\ No newline at end of file